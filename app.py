@@ -1,12 +1,20 @@
-from flask import Flask, request, send_file, jsonify
+from flask import Flask, Response, request, send_file, jsonify
 import subprocess
 import tempfile
 import os
 import shutil
 import sys
-import math
 import zipfile
 import logging
+import struct
+import zlib
+import time
+import hashlib
+import threading
+import itertools
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from io import BytesIO
 
 app = Flask(__name__)
@@ -23,6 +31,48 @@ logger = logging.getLogger(__name__)
 ZINT_PATH = shutil.which('zint') or '/usr/bin/zint'
 logger.info(f"Using Zint path: {ZINT_PATH}")
 
+# Каталог для временных файлов Zint: по умолчанию tmpfs (/dev/shm), чтобы
+# промежуточные файлы не попадали на диск. Если он недоступен или в нем мало
+# свободного места (в Docker /dev/shm по умолчанию 64 МБ) - системный tempdir
+SHM_MIN_FREE = 256 << 20
+
+def default_temp_root():
+    """/dev/shm, если он доступен для записи и в нем достаточно свободного места"""
+    if not (os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK)):
+        return None
+    stat = os.statvfs('/dev/shm')
+    if stat.f_bavail * stat.f_frsize < SHM_MIN_FREE:
+        return None
+    return '/dev/shm'
+
+TEMP_ROOT = os.environ.get('ZINT_TMP') or default_temp_root()
+if TEMP_ROOT and not (os.path.isdir(TEMP_ROOT) and os.access(TEMP_ROOT, os.W_OK)):
+    TEMP_ROOT = None
+logger.info(f"Using temp directory: {TEMP_ROOT or tempfile.gettempdir()}")
+
+# Постоянный пул воркеров для запуска Zint: создается один раз при старте
+# и ограничивает число одновременно работающих процессов Zint
+ZINT_WORKERS = int(os.environ.get('ZINT_WORKERS') or os.cpu_count() or 1)
+
+# Закрепление воркеров Zint за ядрами CPU (ZINT_CPU_AFFINITY=1, только Linux):
+# процессы Zint наследуют маску CPU потока, который их запускает
+ZINT_CPU_AFFINITY = os.environ.get('ZINT_CPU_AFFINITY', '').lower() in ['true', '1', 'yes'] and hasattr(os, 'sched_setaffinity')
+ZINT_WORKER_INDEX = itertools.count()
+
+def pin_zint_worker():
+    """Инициализация потока пула: закрепление за одним ядром из доступных процессу"""
+    cpus = sorted(os.sched_getaffinity(0))
+    cpu = cpus[next(ZINT_WORKER_INDEX) % len(cpus)]
+    # pid 0 - текущий поток
+    os.sched_setaffinity(0, {cpu})
+
+ZINT_POOL = ThreadPoolExecutor(
+    max_workers=ZINT_WORKERS,
+    thread_name_prefix='zint',
+    initializer=pin_zint_worker if ZINT_CPU_AFFINITY else None
+)
+logger.info(f"Using {ZINT_WORKERS} Zint workers{' pinned to CPUs' if ZINT_CPU_AFFINITY else ''}")
+
 # Сопоставление форматов файлов с MIME-типами
 MIME_TYPES = {
     'BMP': 'image/bmp',
@@ -36,6 +86,357 @@ MIME_TYPES = {
     'TXT': 'text/plain'
 }
 
+# Форматы, которые имеет смысл сжимать в ZIP (PNG/GIF/TIF/EMF уже сжаты)
+DEFLATE_FILETYPES = {'SVG', 'EPS', 'TXT', 'BMP', 'PCX'}
+
+# Значения, которые считаются включенным флагом
+TRUE_VALUES = ['', 'true', '1', 'yes']
+
+# Реестр поддерживаемых параметров Zint: имя -> (вид, ключ командной строки).
+# Флаги передаются без значения, остальные параметры - со значением.
+# Параметры, управляющие вводом/выводом Zint (output, input, batch, direct...), не допускаются
+ZINT_FLAGS = (
+    'binary', 'bind', 'bindtop', 'bold', 'box', 'cmyk', 'compliantheight', 'dmiso144', 'dmre',
+    'dotty', 'embedfont', 'esc', 'extraesc', 'fast', 'fullmultibyte', 'gs1', 'gs1nocheck',
+    'gs1parens', 'gs1strict', 'gssep', 'guardwhitespace', 'heightperrow', 'init', 'nobackground',
+    'noquietzones', 'notext', 'quietzones', 'reverse', 'small', 'square', 'werror'
+)
+ZINT_VALUE_OPTIONS = (
+    'addongap', 'bg', 'border', 'cols', 'dotsize', 'eci', 'fg', 'guarddescent', 'height', 'mask',
+    'mode', 'primary', 'rotate', 'rows', 'scale', 'scalexdimdp', 'scmvv', 'secure', 'separator',
+    'seg1', 'seg2', 'seg3', 'seg4', 'seg5', 'seg6', 'seg7', 'seg8', 'seg9', 'structapp', 'textgap',
+    'vers', 'vwhitesp', 'whitesp'
+)
+ZINT_OPTIONS = {
+    **{name: ('flag', f'--{name}') for name in ZINT_FLAGS},
+    **{name: ('value', f'--{name}') for name in ZINT_VALUE_OPTIONS}
+}
+
+def unknown_zint_options(params, handled):
+    """Параметры запроса, отсутствующие в реестре Zint"""
+    return [key for key in params if key not in handled and key not in ZINT_OPTIONS]
+
+def build_zint_options(params, handled):
+    """Преобразование параметров запроса в аргументы командной строки Zint по реестру"""
+    args = []
+    for key, value in params.items():
+        if key in handled:
+            continue
+        kind, flag = ZINT_OPTIONS[key]
+        if kind == 'value':
+            # false/null означают, что параметр не задан
+            if value is not False and value is not None:
+                args += (flag, str(value))
+        elif str(value).lower() in TRUE_VALUES:
+            args.append(flag)
+    return args
+
+# Размер заголовков BMP (файл + BITMAPINFOHEADER), достаточный для проверки формата
+BMP_HEADER_SIZE = 54
+
+def parse_bmp_header(bmp):
+    """Разбор заголовка BMP; ValueError, если формат не поддерживается bmp_to_png"""
+    if len(bmp) < BMP_HEADER_SIZE or bmp[:2] != b'BM':
+        raise ValueError("Zint output is not a BMP file")
+    
+    pixel_offset, header_size, width, height, _, bpp, compression = struct.unpack_from('<IIiiHHI', bmp, 10)
+    colors_used = struct.unpack_from('<I', bmp, 46)[0]
+    if compression != 0 or bpp not in (1, 4, 8, 24):
+        raise ValueError(f"Unsupported BMP format from Zint: {bpp} bpp, compression {compression}")
+    return pixel_offset, header_size, width, height, bpp, colors_used
+
+def bmp_to_png(bmp):
+    """Перекодирование несжатого BMP от Zint в PNG с быстрым сжатием (zlib level 1, без фильтров)"""
+    pixel_offset, header_size, width, height, bpp, colors_used = parse_bmp_header(bmp)
+    
+    # Строки BMP выровнены по 4 байта и по умолчанию идут снизу вверх
+    stride = (width * bpp + 31) // 32 * 4
+    row_size = (width * bpp + 7) // 8
+    rows = range(abs(height)) if height < 0 else range(height - 1, -1, -1)
+    
+    raw = bytearray()
+    for y in rows:
+        start = pixel_offset + y * stride
+        row = bmp[start:start + row_size]
+        raw.append(0)  # Фильтр None
+        if bpp == 24:
+            # BGR -> RGB
+            rgb = bytearray(row_size)
+            rgb[0::3] = row[2::3]
+            rgb[1::3] = row[1::3]
+            rgb[2::3] = row[0::3]
+            raw += rgb
+        else:
+            raw += row
+    
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+    
+    if bpp == 24:
+        png = [chunk(b'IHDR', struct.pack('>IIBBBBB', width, abs(height), 8, 2, 0, 0, 0))]
+    else:
+        # Палитра BMP (BGRX) -> PLTE (RGB)
+        palette_offset = 14 + header_size
+        palette = bytearray()
+        for i in range(colors_used or 1 << bpp):
+            b, g, r = bmp[palette_offset + i * 4:palette_offset + i * 4 + 3]
+            palette += bytes((r, g, b))
+        png = [
+            chunk(b'IHDR', struct.pack('>IIBBBBB', width, abs(height), bpp, 3, 0, 0, 0)),
+            chunk(b'PLTE', bytes(palette))
+        ]
+    png.append(chunk(b'IDAT', zlib.compress(bytes(raw), 1)))
+    png.append(chunk(b'IEND', b''))
+    return b'\x89PNG\r\n\x1a\n' + b''.join(png)
+
+class BarcodeCache:
+    """Потокобезопасный LRU-кэш сгенерированных штрихкодов, ограниченный суммарным размером в байтах"""
+    
+    def __init__(self, max_bytes, max_item_bytes):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self._data = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(args):
+        """Ключ кэша по каноническому (упорядоченному вызывающим кодом) набору аргументов"""
+        return hashlib.blake2b(repr(tuple(args)).encode('utf-8'), digest_size=16).hexdigest()
+    
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+    
+    def put(self, key, value):
+        # Крупные изображения не кэшируем, чтобы они не вытесняли весь кэш
+        if len(value) > min(self.max_item_bytes, self.max_bytes):
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._data[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._size -= len(evicted)
+
+# Кэш результатов одиночной генерации: общий объем и максимальный размер одного
+# изображения в байтах (ZINT_CACHE_BYTES=0 отключает кэш). Кэш свой в каждом процессе
+BARCODE_CACHE = BarcodeCache(
+    int(os.environ.get('ZINT_CACHE_BYTES', 64 << 20)),
+    int(os.environ.get('ZINT_CACHE_ITEM_BYTES', 1 << 20))
+)
+
+def submit_zint(cmd, stdout=subprocess.DEVNULL):
+    """Постановка команды Zint в пул воркеров (stdout по умолчанию не нужен и отбрасывается)"""
+    return ZINT_POOL.submit(
+        subprocess.run,
+        cmd,
+        stdout=stdout,
+        stderr=subprocess.PIPE
+    )
+
+def run_zint(cmd, stdout=subprocess.DEVNULL):
+    """Выполнение команды Zint в пуле воркеров"""
+    return submit_zint(cmd, stdout).result()
+
+def zint_stderr(result):
+    """Текст stderr Zint; декодируется только при необходимости"""
+    return result.stderr.decode('utf-8', 'replace').strip()
+
+class ZipStreamBuffer:
+    """Приемник для ZipFile, накапливающий записанные байты до выдачи клиенту.
+    
+    Перемотка разрешена только в пределах еще не отданных байтов. Этого достаточно ZipFile,
+    чтобы после записи файла переписать его локальный заголовок с реальными размерами и CRC:
+    без data descriptor (флаг 3) архив читают и потоковые распаковщики, которые не принимают
+    его у несжатых (ZIP_STORED) записей. Поэтому порции выдаются только между записями архива.
+    """
+    
+    def __init__(self):
+        # ZipFile пишет неизменяемые bytes, поэтому они хранятся без копирования
+        # и склеиваются один раз при выдаче порции
+        self._chunks = []
+        self._starts = {}  # смещение порции -> индекс в _chunks
+        self._released = 0  # сколько байтов уже отдано
+        self._end = 0
+        self._pos = 0
+    
+    def tell(self):
+        return self._pos
+    
+    def seek(self, pos, whence=os.SEEK_SET):
+        if whence != os.SEEK_SET or not self._released <= pos <= self._end:
+            raise OSError("Unsupported seek in ZIP stream")
+        self._pos = pos
+        return pos
+    
+    def write(self, data):
+        data = bytes(data)
+        if self._pos == self._end:
+            self._starts[self._end] = len(self._chunks)
+            self._chunks.append(data)
+            self._end += len(data)
+        else:
+            # ZipFile переписывает локальный заголовок, ранее записанный одним вызовом write
+            index = self._starts.get(self._pos)
+            if index is None or len(self._chunks[index]) != len(data):
+                raise OSError("Unsupported overwrite in ZIP stream")
+            self._chunks[index] = data
+        self._pos += len(data)
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        self._starts.clear()
+        self._released = self._end
+        return data
+
+def zip_entry(arcname, date_time):
+    """Описание записи архива: общее для всего архива время и права обычного файла (rw-r--r--)"""
+    zinfo = zipfile.ZipInfo(arcname, date_time)
+    zinfo.external_attr = 0o100644 << 16
+    return zinfo
+
+def stream_zip(files, compression, compresslevel, cleanup, convert=None):
+    """Генератор ZIP-архива: отдает данные по мере добавления файлов, затем удаляет временные файлы"""
+    try:
+        buffer = ZipStreamBuffer()
+        # Файлы, попадающие в архив несколько раз (повторяющиеся элементы пакета),
+        # читаются и перекодируются один раз; содержимое хранится до последнего использования
+        remaining = Counter(path for path, _ in files)
+        contents = {}
+        # Время записей вычисляется один раз, без stat каждого файла
+        date_time = time.localtime()[:6]
+        with zipfile.ZipFile(buffer, 'w', compression, compresslevel=compresslevel) as zip_file:
+            for file_path, arcname in files:
+                if file_path in contents:
+                    data = contents[file_path]
+                else:
+                    # Запись все равно отдается клиенту целиком, поэтому файл читается за один раз
+                    with open(file_path, 'rb') as f:
+                        data = f.read()
+                    if convert:
+                        data = convert(data)
+                    if remaining[file_path] > 1:
+                        contents[file_path] = data
+                zip_file.writestr(
+                    zip_entry(arcname, date_time), data,
+                    compress_type=compression, compresslevel=compresslevel
+                )
+                remaining[file_path] -= 1
+                if not remaining[file_path]:
+                    contents.pop(file_path, None)
+                logger.info("Added to ZIP: %s", arcname)
+                # Запись завершена и ее заголовок больше не меняется - отдаем клиенту
+                yield buffer.pop()
+        # Центральный каталог архива
+        yield buffer.pop()
+    finally:
+        cleanup.close()
+
+def run_zint_batch(work_dir, items, barcode_type, zint_filetype, options, output_pattern, num_digits):
+    """Пакетная генерация Zint в каталоге work_dir.
+    
+    Возвращает (пути файлов по порядку items или None для отсутствующих, текст ошибки Zint или None)
+    """
+    zint_ext = zint_filetype.lower()
+    tilde_str = '~' * num_digits
+    
+    # Большой пакет делим на части и обрабатываем параллельно несколькими
+    # процессами Zint; каждая часть пишет файлы в свой подкаталог
+    if ZINT_WORKERS > 1 and len(items) >= 2 * ZINT_WORKERS:
+        shard_size = -(-len(items) // ZINT_WORKERS)
+    else:
+        shard_size = len(items)
+    
+    shards = []
+    futures = []
+    for offset in range(0, len(items), shard_size):
+        shard_items = items[offset:offset + shard_size]
+        if shard_size == len(items):
+            shard_dir = work_dir
+        else:
+            shard_dir = f"{work_dir}{os.sep}shard_{offset // shard_size}"
+            os.mkdir(shard_dir)
+    
+        # Создаем входной файл для Zint одной записью (каждая строка - отдельный штрихкод)
+        input_path = f"{shard_dir}{os.sep}input.txt"
+        payload = ('\n'.join(shard_items) + '\n').encode('utf-8')
+        with open(input_path, 'wb') as f:
+            f.write(payload)
+    
+        # Формируем шаблон выходного файла
+        output_template = f"{shard_dir}{os.sep}{output_pattern}{tilde_str}.{zint_ext}"
+    
+        # Собираем команду Zint
+        cmd = [
+            ZINT_PATH,
+            '--batch',
+            '--barcode', str(barcode_type),
+            '--filetype', zint_filetype,
+            '--output', output_template,
+            '--input', input_path,
+            *options
+        ]
+    
+        # Строку команды собираем только если INFO-логирование включено
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Executing command: %s", ' '.join(cmd))
+    
+        # Запускаем команду
+        shards.append((offset, len(shard_items), shard_dir))
+        futures.append(submit_zint(cmd))
+    
+    # Дожидаемся завершения всех частей
+    results = [future.result() for future in futures]
+    for result in results:
+        # Логируем вывод Zint
+        if result.stderr:
+            logger.error("Zint stderr: %s", zint_stderr(result))
+    
+        if result.returncode != 0:
+            return None, f"Zint batch error ({result.returncode}): {zint_stderr(result)}"
+    
+    # Собираем сгенерированные файлы
+    files = [None] * len(items)
+    for offset, count, shard_dir in shards:
+        # Ожидаемые имена файлов (номер с ведущими нулями) -> номер в части
+        expected = {
+            f"{output_pattern}{str(i).zfill(num_digits)}.{zint_ext}": i
+            for i in range(1, count + 1)
+        }
+        # Один проход по каталогу вместо проверки каждого файла
+        with os.scandir(shard_dir) as entries:
+            present = {entry.name: entry.path for entry in entries if entry.name in expected}
+    
+        for filename, i in expected.items():
+            if filename in present:
+                files[offset + i - 1] = present[filename]
+            else:
+                logger.warning("Missing output file: %s%s%s", shard_dir, os.sep, filename)
+    
+    return files, None
+
+def bmp_supported(file_path):
+    """Проверка, что BMP от Zint может быть перекодирован bmp_to_png"""
+    with open(file_path, 'rb') as f:
+        header = f.read(BMP_HEADER_SIZE)
+    try:
+        parse_bmp_header(header)
+    except ValueError:
+        return False
+    return True
+
 @app.route('/generate_batch', methods=['POST'])
 def generate_batch():
     """Пакетная генерация штрихкодов с использованием batch-режима Zint"""
@@ -55,7 +456,7 @@ def generate_batch():
                 "message": "Invalid JSON data. Expecting object with parameters"
             }), 400
         
-        logger.info(f"Received batch request with {len(request_data.get('items', []))} items")
+        logger.info("Received batch request with %d items", len(request_data.get('items', [])))
         
         # Извлекаем параметры
         items = request_data.get('items', [])
@@ -71,98 +472,86 @@ def generate_batch():
                 "message": "All items must be strings"
             }), 400
         
+        # Параметры, которые обрабатываются отдельно от реестра Zint
+        handled_params = ['type', 'filetype', 'scale', 'output_pattern', 'fast_png']
+        unknown = unknown_zint_options(common_params, handled_params)
+        if unknown:
+            return jsonify({
+                "error": "Bad Request",
+                "message": f"Unknown parameters: {', '.join(unknown)}"
+            }), 400
+        
         # Создаем временную директорию для работы
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Создаем входной файл для Zint
-            input_path = os.path.join(temp_dir, 'input.txt')
-            with open(input_path, 'w', encoding='utf-8') as f:
-                for item in items:
-                    f.write(item + '\n')  # Каждая строка - отдельный штрихкод
-            
+        with ExitStack() as stack:
+            temp_dir = stack.enter_context(tempfile.TemporaryDirectory(dir=TEMP_ROOT))
             # Определяем параметры генерации
             filetype = common_params.get('filetype', 'PNG').upper()
             barcode_type = common_params.get('type', '71')
             scale = common_params.get('scale', 2)
             output_pattern = common_params.get('output_pattern', 'barcode_')
             
-            # Определяем количество тильд для нумерации
-            num_digits = max(3, math.ceil(math.log10(len(items) + 1)))
-            tilde_str = '~' * num_digits
+            # Быстрый PNG: Zint генерирует BMP, который затем перекодируется в PNG
+            fast_png = filetype == 'PNG' and str(common_params.get('fast_png', False)).lower() in TRUE_VALUES
+            zint_filetype = 'BMP' if fast_png else filetype
             
-            # Формируем шаблон выходного файла
-            output_template = os.path.join(temp_dir, f"{output_pattern}{tilde_str}.{filetype.lower()}")
+            # Расширение файлов в архиве вычисляем один раз для всех элементов пакета
+            ext = filetype.lower()
             
-            # Собираем команду Zint
-            cmd = [
-                ZINT_PATH,
-                '--batch',
-                '--barcode', str(barcode_type),
-                '--filetype', filetype,
-                '--output', output_template,
-                '--input', input_path,
-                '--scale', str(scale)
-            ]
+            # Определяем количество тильд для нумерации
+            num_digits = max(3, len(str(len(items))))
             
-            # Добавляем общие параметры
-            for param, value in common_params.items():
-                if param in ['type', 'filetype', 'scale', 'output_pattern']:
-                    continue  # Уже обработаны
-                
-                # Булевые параметры (флаги)
-                if isinstance(value, bool) and value:
-                    cmd.append(f'--{param}')
-                # Параметры со значениями
-                elif not isinstance(value, bool):
-                    cmd.extend([f'--{param}', str(value)])
+            # Повторяющиеся элементы генерируем один раз: Zint получает только уникальные
+            # строки, а в архив каждый файл попадает под номерами всех своих повторов
+            unique_items = list(dict.fromkeys(items))
+            unique_index = {item: i for i, item in enumerate(unique_items)}
+            if len(unique_items) < len(items):
+                logger.info("Batch has %d unique items", len(unique_items))
             
-            logger.info(f"Executing command: {' '.join(cmd)}")
+            # Общие параметры команды Zint
+            options = ['--scale', str(scale), *build_zint_options(common_params, handled_params)]
             
-            # Выполняем команду
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                encoding='utf-8',
-                errors='replace'
+            # Генерируем штрихкоды уникальных элементов
+            unique_files, error_msg = run_zint_batch(
+                temp_dir, unique_items, barcode_type, zint_filetype, options, output_pattern, num_digits
             )
-            
-            # Логируем вывод Zint
-            if result.stdout:
-                logger.info(f"Zint stdout: {result.stdout}")
-            if result.stderr:
-                logger.error(f"Zint stderr: {result.stderr}")
-            
-            if result.returncode != 0:
-                error_msg = f"Zint batch error ({result.returncode}): {result.stderr.strip() or result.stdout.strip()}"
+            if error_msg:
                 return jsonify({"error": "Barcode generation failed", "details": error_msg}), 500
             
-            # Собираем сгенерированные файлы
+            # Перекодирование BMP выполняется уже во время отправки архива, поэтому формат
+            # проверяем заранее. Если Zint выдал BMP, который bmp_to_png не поддерживает
+            # (например, 32 bpp при цветах с прозрачностью), генерируем PNG средствами Zint
+            if fast_png and not all(bmp_supported(path) for path in unique_files if path):
+                logger.warning("Zint BMP output is not supported by fast_png, falling back to native PNG")
+                fast_png = False
+                fallback_dir = f"{temp_dir}{os.sep}png"
+                os.mkdir(fallback_dir)
+                unique_files, error_msg = run_zint_batch(
+                    fallback_dir, unique_items, barcode_type, filetype, options, output_pattern, num_digits
+                )
+                if error_msg:
+                    return jsonify({"error": "Barcode generation failed", "details": error_msg}), 500
+            
+            # Раскладываем файлы по исходным позициям элементов (сквозная нумерация)
             generated_files = []
-            for i in range(1, len(items) + 1):
-                # Форматируем номер с ведущими нулями
-                num_str = str(i).zfill(num_digits)
-                filename = f"{output_pattern}{num_str}.{filetype.lower()}"
-                file_path = os.path.join(temp_dir, filename)
-                
-                if os.path.exists(file_path):
-                    generated_files.append(file_path)
-                else:
-                    logger.warning(f"Missing output file: {file_path}")
+            for i, item in enumerate(items, 1):
+                file_path = unique_files[unique_index[item]]
+                if file_path:
+                    generated_files.append((file_path, f"{output_pattern}{str(i).zfill(num_digits)}.{ext}"))
             
-            # Создаем ZIP-архив
-            zip_buffer = BytesIO()
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                for file_path in generated_files:
-                    arcname = os.path.basename(file_path)
-                    zip_file.write(file_path, arcname)
-                    logger.info(f"Added to ZIP: {arcname}")
+            # Отдаем ZIP-архив потоком; временная директория удаляется после отправки
+            # Уже сжатые форматы сохраняем без повторного deflate
+            if filetype in DEFLATE_FILETYPES:
+                compression, compresslevel = zipfile.ZIP_DEFLATED, 1
+            else:
+                compression, compresslevel = zipfile.ZIP_STORED, None
             
-            zip_buffer.seek(0)
-            return send_file(
-                zip_buffer,
+            return Response(
+                stream_zip(
+                    generated_files, compression, compresslevel, stack.pop_all(),
+                    convert=bmp_to_png if fast_png else None
+                ),
                 mimetype='application/zip',
-                as_attachment=True,
-                download_name='barcodes.zip'
+                headers={'Content-Disposition': 'attachment; filename=barcodes.zip'}
             )
     
     except Exception as e:
@@ -181,7 +570,16 @@ def generate_single():
             # Для GET - параметры из query string
             params = request.args.to_dict()
         
-        logger.info(f"Received generation request via {request.method}")
+        logger.info("Received generation request via %s", request.method)
+        
+        # Параметры, которые обрабатываются отдельно от реестра Zint
+        handled_params = ['data', 'filetype', 'type', 'fast_png', 'cache_control']
+        unknown = unknown_zint_options(params, handled_params)
+        if unknown:
+            return jsonify({
+                "error": "Bad Request",
+                "message": f"Unknown parameters: {', '.join(unknown)}"
+            }), 400
 
         # Обработка данных - замена квадратных скобок на круглые
         data = params.get('data', '')
@@ -192,57 +590,79 @@ def generate_single():
         # Определяем формат файла
         filetype = params.get('filetype', 'PNG').upper()
         mime_type = MIME_TYPES.get(filetype, 'application/octet-stream')
-
-        # Создаем временный файл для вывода
-        with tempfile.NamedTemporaryFile(suffix=f".{filetype}", delete=False) as tmp:
-            output_path = tmp.name
+        
+        # Быстрый PNG: Zint генерирует BMP, который затем перекодируется в PNG
+        fast_png = filetype == 'PNG' and str(params.get('fast_png', False)).lower() in TRUE_VALUES
+        zint_filetype = 'BMP' if fast_png else filetype
+        
+        # cache_control=no-store - генерировать без использования кэша
+        use_cache = str(params.get('cache_control', '')).lower() != 'no-store'
         
         # Базовые параметры команды
         cmd = [
             ZINT_PATH,
             '--data', data,
-            '--filetype', filetype,
-            '-o', output_path
+            '--filetype', zint_filetype
         ]
         
         # Добавляем тип штрихкода (обязательный параметр)
         barcode_type = params.get('type', '58')
         cmd.extend(['--barcode', str(barcode_type)])
         
-        # Обрабатываем все остальные параметры
-        for key, value in params.items():
-            # Пропускаем уже обработанные параметры
-            if key in ['data', 'filetype', 'type']:
-                continue
-            
-            # Для GET-запросов: булевы параметры без значения
-            if request.method == 'GET' and value == '':
-                cmd.append(f'--{key}')
-            # Для POST-запросов: булевы параметры как true/false
-            elif request.method == 'POST' and isinstance(value, bool) and value:
-                cmd.append(f'--{key}')
-            # Для POST-запросов: булевы параметры как строки
-            elif request.method == 'POST' and isinstance(value, str) and value.lower() in ['true', '1', 'yes']:
-                cmd.append(f'--{key}')
-            # Числовые/строковые параметры
-            else:
-                cmd.extend([f'--{key}', str(value)])
+        # Обрабатываем все остальные параметры (флаги: без значения в GET, true/"true"/"1"/"yes").
+        # Параметры сортируются по имени, чтобы порядок в запросе не влиял на ключ кэша
+        options = build_zint_options(dict(sorted(params.items())), handled_params)
+        cmd.extend(options)
         
-        logger.info(f"Command: {' '.join(cmd)}")
+        # ETag зависит только от параметров, поэтому клиенту с актуальной копией
+        # отвечаем 304 без обращения к кэшу и Zint
+        cache_key = BarcodeCache.make_key([data, filetype, str(barcode_type), fast_png, *options])
+        if cache_key in request.if_none_match:
+            response = Response(status=304)
+            response.set_etag(cache_key)
+            return response
+        
+        # Отдаем готовый результат из кэша, если он есть
+        image = BARCODE_CACHE.get(cache_key) if use_cache else None
+        if image is not None:
+            logger.info("Serving barcode from cache")
+            return send_file(BytesIO(image), mimetype=mime_type, etag=cache_key)
+        
+        # Zint пишет изображение сразу в stdout, без временного файла
+        cmd.append('--direct')
+        
+        # Строку команды собираем только если INFO-логирование включено
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Command: %s", ' '.join(cmd))
         
         # Выполняем команду
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_zint(cmd, stdout=subprocess.PIPE)
         if result.returncode != 0:
-            error_msg = f"Zint error ({result.returncode}): {result.stderr.strip() or result.stdout.strip()}"
+            error_msg = f"Zint error ({result.returncode}): {zint_stderr(result)}"
             logger.error(error_msg)
             return jsonify({"error": "Barcode generation failed", "details": error_msg}), 400
         
-        # Отправляем файл
-        response = send_file(output_path, mimetype=mime_type)
+        image = result.stdout
+        if fast_png:
+            try:
+                image = bmp_to_png(image)
+            except ValueError as e:
+                # BMP, который bmp_to_png не поддерживает (например, 32 bpp при цветах
+                # с прозрачностью) - генерируем PNG средствами Zint
+                logger.warning("%s, falling back to native PNG", e)
+                cmd[4] = filetype  # значение --filetype в базовых параметрах команды
+                result = run_zint(cmd, stdout=subprocess.PIPE)
+                if result.returncode != 0:
+                    error_msg = f"Zint error ({result.returncode}): {zint_stderr(result)}"
+                    logger.error(error_msg)
+                    return jsonify({"error": "Barcode generation failed", "details": error_msg}), 400
+                image = result.stdout
+        
+        if use_cache:
+            BARCODE_CACHE.put(cache_key, image)
         
-        # Удаляем временный файл
-        os.unlink(output_path)
-        return response
+        # Отправляем файл
+        return send_file(BytesIO(image), mimetype=mime_type, etag=cache_key)
     
     except Exception as e:
         logger.exception("Unexpected error in generate_single")
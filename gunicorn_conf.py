@@ -0,0 +1,23 @@
+import multiprocessing
+import os
+
+# Gunicorn: процессы с потоками (gthread) - обработчики почти все время ждут
+# завершения Zint, поэтому потоки хорошо масштабируются
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+worker_class = 'gthread'
+
+# Немного процессов, у каждого - свой пул из нескольких процессов Zint:
+# так пакеты делятся на части и генерируются параллельно (нужно ZINT_WORKERS > 1),
+# а всего процессов Zint остается около числа ядер
+cpu_count = multiprocessing.cpu_count()
+workers = int(os.environ.get('WEB_WORKERS') or max(1, cpu_count // 4))
+os.environ.setdefault('ZINT_WORKERS', str(max(1, cpu_count // workers)))
+
+# Потоков вдвое больше, чем мест в пуле Zint процесса: пока одни запросы ждут Zint,
+# другие принимают данные и отдают ответы
+threads = int(os.environ.get('WEB_THREADS') or 2 * int(os.environ['ZINT_WORKERS']))
+
+# Приложение загружается один раз в мастер-процессе и наследуется воркерами.
+# Пул воркеров Zint и кэш штрихкодов остаются своими в каждом процессе:
+# потоки пула создаются только при первой задаче, то есть уже после fork
+preload_app = True
@@ -0,0 +1,270 @@
+import io
+import json
+import struct
+import sys
+import zipfile
+import zlib
+
+import pytest
+
+pytest.importorskip('flask')
+
+import app
+from app import bmp_to_png, parse_bmp_header
+
+# Заглушка Zint: в режиме --direct выводит полученные аргументы в JSON, в пакетном режиме
+# пишет в каждый файл "<filetype>:<строка>". Вместо BMP выдает неподдерживаемый 32 bpp.
+# Каждый вызов (аргументы и строки входного файла) записывается в файл ZINT_STUB_LOG
+ZINT_STUB = r'''
+import json, os, struct, sys
+
+args = sys.argv[1:]
+
+def option(name):
+    return args[args.index(name) + 1]
+
+filetype = option('--filetype')
+
+def render(data):
+    if filetype == 'BMP':
+        bmp = bytearray(b'BM' + bytes(60))
+        struct.pack_into('<IIiiHHI', bmp, 10, 62, 40, 1, 1, 1, 32, 0)
+        return bytes(bmp)
+    return f'{filetype}:{data}'.encode('utf-8')
+
+lines = None
+if '--batch' in args:
+    with open(option('--input'), encoding='utf-8') as f:
+        lines = f.read().splitlines()
+with open(os.environ['ZINT_STUB_LOG'], 'a') as log:
+    log.write(json.dumps({'args': args, 'input': lines}) + '\n')
+
+if lines is not None:
+    template = option('--output')
+    digits = template.count('~')
+    for i, line in enumerate(lines, 1):
+        with open(template.replace('~' * digits, str(i).zfill(digits)), 'wb') as out:
+            out.write(render(line))
+elif filetype == 'BMP':
+    sys.stdout.buffer.write(render(option('--data')))
+else:
+    sys.stdout.write(json.dumps(args))
+'''
+
+
+@pytest.fixture
+def zint_calls(tmp_path, monkeypatch):
+    """Подменяет Zint заглушкой; возвращает функцию, читающую журнал вызовов"""
+    stub = tmp_path / 'zint'
+    stub.write_text(f'#!{sys.executable}\n{ZINT_STUB}')
+    stub.chmod(0o755)
+    log = tmp_path / 'calls.log'
+    log.touch()
+    monkeypatch.setattr(app, 'ZINT_PATH', str(stub))
+    monkeypatch.setattr(app, 'BARCODE_CACHE', app.BarcodeCache(1 << 20, 1 << 20))
+    monkeypatch.setenv('ZINT_STUB_LOG', str(log))
+    return lambda: [json.loads(line) for line in log.read_text().splitlines()]
+
+
+@pytest.fixture
+def client(zint_calls):
+    return app.app.test_client()
+
+
+def zint_args(response):
+    assert response.status_code == 200
+    return json.loads(response.data)
+
+
+def make_bmp(width, height, bpp, pixels, palette=(), top_down=False):
+    """Несжатый BMP (BITMAPINFOHEADER); pixels - строки сверху вниз (индексы палитры или RGB)"""
+    stride = (width * bpp + 31) // 32 * 4
+    rows = []
+    for line in pixels:
+        row = bytearray(stride)
+        for x, value in enumerate(line):
+            if bpp == 24:
+                r, g, b = value
+                row[x * 3:x * 3 + 3] = bytes((b, g, r))
+            else:
+                per_byte = 8 // bpp
+                shift = (per_byte - 1 - x % per_byte) * bpp
+                row[x // per_byte] |= value << shift
+        rows.append(bytes(row))
+    if not top_down:
+        rows.reverse()
+
+    colour_table = b''.join(bytes((b, g, r, 0)) for r, g, b in palette)
+    pixel_offset = 14 + 40 + len(colour_table)
+    data = b''.join(rows)
+    info = struct.pack(
+        '<IiiHHIIiiII', 40, width, -height if top_down else height, 1, bpp, 0, len(data), 0, 0, len(palette), 0
+    )
+    return b'BM' + struct.pack('<IHHI', pixel_offset + len(data), 0, 0, pixel_offset) + info + colour_table + data
+
+
+def decode_png(png):
+    """Минимальный декодер PNG без фильтров: возвращает строки пикселей в RGB"""
+    assert png[:8] == b'\x89PNG\r\n\x1a\n'
+    chunks, idat, pos = {}, b'', 8
+    while pos < len(png):
+        length, tag = struct.unpack_from('>I4s', png, pos)
+        data = png[pos + 8:pos + 8 + length]
+        assert struct.unpack_from('>I', png, pos + 8 + length)[0] == zlib.crc32(tag + data)
+        if tag == b'IDAT':
+            idat += data
+        else:
+            chunks[tag] = data
+        pos += 12 + length
+    assert b'IEND' in chunks
+
+    width, height, depth, colour_type = struct.unpack_from('>IIBB', chunks[b'IHDR'])
+    raw = zlib.decompress(idat)
+    row_size = (width * depth * (3 if colour_type == 2 else 1) + 7) // 8
+    result = []
+    for y in range(height):
+        row = raw[y * (row_size + 1):(y + 1) * (row_size + 1)]
+        assert row[0] == 0
+        row = row[1:]
+        if colour_type == 2:
+            result.append([tuple(row[x * 3:x * 3 + 3]) for x in range(width)])
+        else:
+            palette = chunks[b'PLTE']
+            line = []
+            for x in range(width):
+                per_byte = 8 // depth
+                shift = (per_byte - 1 - x % per_byte) * depth
+                index = (row[x // per_byte] >> shift) & ((1 << depth) - 1)
+                line.append(tuple(palette[index * 3:index * 3 + 3]))
+            result.append(line)
+    return result
+
+
+@pytest.mark.parametrize('top_down', [False, True])
+@pytest.mark.parametrize('bpp', [1, 4, 8, 24])
+def test_bmp_to_png_round_trip(bpp, top_down):
+    width, height = 13, 5
+    if bpp == 24:
+        palette = ()
+        pixels = [[(x * 19 % 256, y * 50, (x + y) * 7) for x in range(width)] for y in range(height)]
+        expected = pixels
+    else:
+        palette = [(i * 37 % 256, i * 11 % 256, 255 - i) for i in range(1 << bpp)]
+        pixels = [[(x + 3 * y) % (1 << bpp) for x in range(width)] for y in range(height)]
+        expected = [[palette[index] for index in line] for line in pixels]
+
+    png = bmp_to_png(make_bmp(width, height, bpp, pixels, palette, top_down))
+
+    assert decode_png(png) == expected
+
+
+def with_header_field(bmp, offset, fmt, value):
+    bmp = bytearray(bmp)
+    struct.pack_into(fmt, bmp, offset, value)
+    return bytes(bmp)
+
+
+@pytest.mark.parametrize('bmp', [
+    b'GIF89a' + bytes(60),
+    b'BM' + bytes(10),
+    # 32 bpp
+    with_header_field(make_bmp(2, 2, 24, [[(0, 0, 0)] * 2] * 2), 28, '<H', 32),
+    # BI_BITFIELDS
+    with_header_field(make_bmp(2, 2, 24, [[(0, 0, 0)] * 2] * 2), 30, '<I', 3),
+])
+def test_parse_bmp_header_rejects_unsupported(bmp):
+    with pytest.raises(ValueError):
+        parse_bmp_header(bmp)
+
+
+def test_generate_get_flags_and_values(client):
+    args = zint_args(client.get('/generate?data=abc&type=20&gs1&height=50&notext=false&box=true'))
+
+    assert args[args.index('--barcode') + 1] == '20'
+    assert args[args.index('--height') + 1] == '50'
+    assert '--gs1' in args
+    assert '--box' in args
+    assert '--notext' not in args
+
+
+def test_generate_post_flags_and_values(client):
+    args = zint_args(client.post('/generate', json={
+        'data': 'abc',
+        'gs1': 'true',
+        'box': True,
+        'notext': False,
+        'height': None,
+        'border': False,
+        'scale': 2
+    }))
+
+    assert '--gs1' in args
+    assert '--box' in args
+    assert args[args.index('--scale') + 1] == '2'
+    for option in ('--notext', '--height', '--border'):
+        assert option not in args
+
+
+@pytest.mark.parametrize('option', ['output', 'input', 'batch', 'direct', 'bogus'])
+def test_unknown_options_rejected(client, zint_calls, option):
+    response = client.get(f'/generate?data=abc&{option}=/tmp/x')
+    assert response.status_code == 400
+    assert option in response.get_json()['message']
+
+    response = client.post('/generate_batch', json={'common': {option: '/tmp/x'}, 'items': ['a']})
+    assert response.status_code == 400
+    assert option in response.get_json()['message']
+
+    assert zint_calls() == []
+
+
+def test_generate_cache_key_ignores_parameter_order(client, zint_calls):
+    first = client.get('/generate?data=abc&height=50&scale=2')
+    second = client.get('/generate?data=abc&scale=2&height=50')
+
+    assert first.status_code == second.status_code == 200
+    assert first.headers['ETag'] == second.headers['ETag']
+    assert second.data == first.data
+    assert len(zint_calls()) == 1
+
+
+def test_generate_if_none_match_skips_zint(client, zint_calls):
+    etag = client.get('/generate?data=abc&cache_control=no-store').headers['ETag']
+
+    response = client.get('/generate?data=abc', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert len(zint_calls()) == 1
+
+
+def read_zip(response):
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    assert archive.testzip() is None
+    # Локальные заголовки содержат размеры и CRC, без data descriptor
+    assert all(info.flag_bits & 0x08 == 0 for info in archive.infolist())
+    return {name: archive.read(name).decode('utf-8') for name in archive.namelist()}
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_generate_batch_numbering_with_shards_and_duplicates(client, zint_calls, monkeypatch, workers):
+    monkeypatch.setattr(app, 'ZINT_WORKERS', workers)
+    items = ['a', 'b', 'a', 'c', 'd', 'b', 'e']
+
+    files = read_zip(client.post('/generate_batch', json={'common': {'filetype': 'svg'}, 'items': items}))
+
+    assert list(files) == [f'barcode_{i:03}.svg' for i in range(1, len(items) + 1)]
+    assert list(files.values()) == [f'SVG:{item}' for item in items]
+    # Каждый уникальный элемент генерируется один раз; при workers=2 - в двух частях
+    calls = zint_calls()
+    assert len(calls) == workers
+    assert [line for call in calls for line in call['input']] == ['a', 'b', 'c', 'd', 'e']
+
+
+def test_generate_fast_png_falls_back_to_native_png(client, zint_calls):
+    args = zint_args(client.get('/generate?data=abc&fast_png'))
+    assert args[args.index('--filetype') + 1] == 'PNG'
+    assert [call['args'][call['args'].index('--filetype') + 1] for call in zint_calls()] == ['BMP', 'PNG']
+
+    files = read_zip(client.post('/generate_batch', json={'common': {'fast_png': True}, 'items': ['x', 'y', 'x']}))
+    assert files == {'barcode_001.png': 'PNG:x', 'barcode_002.png': 'PNG:y', 'barcode_003.png': 'PNG:x'}